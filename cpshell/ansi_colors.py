@@ -10,6 +10,8 @@
 # Website: https://github.com/bablokb/cp-shell
 # -------------------------------------------------------------------------
 
+import sys
+
 # Attributes
 # 0 Reset all attributes
 # 1 Bright
@@ -19,39 +21,66 @@
 # 7 Reverse
 # 8 Hidden
 
-LT_BLACK = "\x1b[1;30m"
-LT_RED = "\x1b[1;31m"
-LT_GREEN = "\x1b[1;32m"
-LT_YELLOW = "\x1b[1;33m"
-LT_BLUE = "\x1b[1;34m"
-LT_MAGENTA = "\x1b[1;35m"
-LT_CYAN = "\x1b[1;36m"
-LT_WHITE = "\x1b[1;37m"
-
-DK_BLACK = "\x1b[2;30m"
-DK_RED = "\x1b[2;31m"
-DK_GREEN = "\x1b[2;32m"
-DK_YELLOW = "\x1b[2;33m"
-DK_BLUE = "\x1b[2;34m"
-DK_MAGENTA = "\x1b[2;35m"
-DK_CYAN = "\x1b[2;36m"
-DK_WHITE = "\x1b[2;37m"
-
 NO_COLOR = "\x1b[0m"
-BG_LT_BLACK = "\x1b[1;40m"
-BG_LT_RED = "\x1b[1;41m"
-BG_LT_GREEN = "\x1b[1;42m"
-BG_LT_YELLOW = "\x1b[1;43m"
-BG_LT_BLUE = "\x1b[1;44m"
-BG_LT_MAGENTA = "\x1b[1;45m"
-BG_LT_CYAN = "\x1b[1;46m"
-BG_LT_WHITE = "\x1b[1;47m"
-
-BG_DK_BLACK = "\x1b[2;40m"
-BG_DK_RED = "\x1b[2;41m"
-BG_DK_GREEN = "\x1b[2;42m"
-BG_DK_YELLOW = "\x1b[2;43m"
-BG_DK_BLUE = "\x1b[2;44m"
-BG_DK_MAGENTA = "\x1b[2;45m"
-BG_DK_CYAN = "\x1b[2;46m"
-BG_DK_WHITE = "\x1b[2;47m"
+
+# name -> (attribute, color-code). The escape sequences are only built
+# on first access (see __getattr__ below).
+_COLORS = {
+  "LT_BLACK":      (1, 30),
+  "LT_RED":        (1, 31),
+  "LT_GREEN":      (1, 32),
+  "LT_YELLOW":     (1, 33),
+  "LT_BLUE":       (1, 34),
+  "LT_MAGENTA":    (1, 35),
+  "LT_CYAN":       (1, 36),
+  "LT_WHITE":      (1, 37),
+
+  "DK_BLACK":      (2, 30),
+  "DK_RED":        (2, 31),
+  "DK_GREEN":      (2, 32),
+  "DK_YELLOW":     (2, 33),
+  "DK_BLUE":       (2, 34),
+  "DK_MAGENTA":    (2, 35),
+  "DK_CYAN":       (2, 36),
+  "DK_WHITE":      (2, 37),
+
+  "BG_LT_BLACK":   (1, 40),
+  "BG_LT_RED":     (1, 41),
+  "BG_LT_GREEN":   (1, 42),
+  "BG_LT_YELLOW":  (1, 43),
+  "BG_LT_BLUE":    (1, 44),
+  "BG_LT_MAGENTA": (1, 45),
+  "BG_LT_CYAN":    (1, 46),
+  "BG_LT_WHITE":   (1, 47),
+
+  "BG_DK_BLACK":   (2, 40),
+  "BG_DK_RED":     (2, 41),
+  "BG_DK_GREEN":   (2, 42),
+  "BG_DK_YELLOW":  (2, 43),
+  "BG_DK_BLUE":    (2, 44),
+  "BG_DK_MAGENTA": (2, 45),
+  "BG_DK_CYAN":    (2, 46),
+  "BG_DK_WHITE":   (2, 47),
+  }
+
+_COLOR_CACHE = {}
+
+def color(attr, code):
+  """ return the (interned) escape sequence for attribute and color-code """
+  key = (attr, code)
+  seq = _COLOR_CACHE.get(key)
+  if seq is None:
+    seq = sys.intern(f"\x1b[{attr};{code}m")
+    _COLOR_CACHE[key] = seq
+  return seq
+
+def __getattr__(name):
+  """ lazily create the named color constants """
+  try:
+    return color(*_COLORS[name])
+  except KeyError:
+    raise AttributeError(
+      f"module {__name__!r} has no attribute {name!r}") from None
+
+def __dir__():
+  return sorted(list(globals()) + list(_COLORS))
@@ -14,8 +14,13 @@
 import cmd
 import sys
 import os
+import io
 import shutil
 import shlex
+import re
+import bisect
+import signal
+import time
 import itertools
 import traceback
 
@@ -34,17 +39,43 @@ from .commands.command import Command
 # things work most of the time. If you try to backspace when at the first
 # column of the input it wipes out the prompt, but everything returns to normal
 # if you hit return.
-
-import readline
-import rlcompleter
-if readline.__doc__ and 'libedit' in readline.__doc__:
-  readline.parse_and_bind ("bind ^I rl_complete")
-else:
-  readline.parse_and_bind("tab: complete")
+#
+# readline is only imported and configured once the interactive command-loop
+# starts (see CmdShell._init_readline()), so running a single command or a
+# command-file does not pay for it.
 
 # DELIMS is used by readline for determining word boundaries.
 DELIMS = ' \t\n>;'
 
+# Directory listings used for completion are cached for a short time,
+# since readline calls the completer multiple times per TAB.
+COMPLETE_CACHE_TTL = 2.0
+
+# Remote directories which failed or returned nothing are remembered a bit
+# longer, so that completing a mistyped path stays fast.
+COMPLETE_NEG_CACHE_TTL = 5.0
+
+# Commands that modify the filesystem (or the current directory). These
+# invalidate the completion cache.
+MUTATING_CMDS = ('cd', 'cp', 'edit', 'mkdir', 'repl', 'rm', 'rsync', 'shell')
+
+# Tables for escaping/unescaping filenames
+_ESCAPE_TABLE = str.maketrans({'\\': '\\\\', ' ': '\\ '})
+_UNESCAPE_RE = re.compile(r'\\(.?)', re.DOTALL)
+
+# Matches everything up to (and including) the last unescaped delimiter
+_LAST_DELIM_RE = re.compile(r'.*(?<!\\)[' + re.escape(DELIMS) + ']', re.DOTALL)
+
+# --- Helper function for completion   --------------------------------------
+
+def _prefix_range(paths, prefix):
+  """Return the entries of the sorted list paths starting with prefix."""
+  if not prefix:
+    return paths
+  lo = bisect.bisect_left(paths, prefix)
+  hi = bisect.bisect_left(paths, prefix[:-1] + chr(ord(prefix[-1]) + 1), lo)
+  return paths[lo:hi]
+
 # --- Helper class for file-write operation   --------------------------------
 
 class SmartFile(object):
@@ -52,10 +83,15 @@ class SmartFile(object):
 
   def __init__(self, file):
     self.file = file
+    # bind the writer for str once, writing str is the common case
+    self._write = file.write
 
   def close(self):
     self.file.close()
 
+  def fileno(self):
+    return self.file.fileno()
+
   def flush(self):
     self.file.flush()
 
@@ -70,7 +106,11 @@ class SmartFile(object):
 
   def write(self, data):
     if isinstance(data, str):
-      return self.file.write(data)
+      return self._write(data)
+    return self.file.buffer.write(data)
+
+  def write_bytes(self, data):
+    """Write bytes, for callers which know they don't have a str."""
     return self.file.buffer.write(data)
 
 # --- Helper class for errors   ----------------------------------------------
@@ -84,9 +124,12 @@ class CmdShellError(Exception):
 class CmdShell(cmd.Cmd):
   """Implements the shell as a command line interpreter."""
 
+  _readline_initialized = False
+
   def __init__(self, options, **kwargs):
     cmd.Cmd.__init__(self, **kwargs)
     self._options = options
+    self._debug = options.debug     # never changes, avoid the lookups
     if 'stdin' in kwargs:
       cmd.Cmd.use_rawinput = 0
 
@@ -102,27 +145,63 @@ class CmdShell(cmd.Cmd):
     self.cur_dir = os.getcwd()
     self.prev_dir = self.cur_dir
     self.columns = shutil.get_terminal_size().columns
+    if hasattr(signal, 'SIGWINCH'):
+      # keep track of the terminal width (used e.g. by ls)
+      try:
+        signal.signal(signal.SIGWINCH, self._update_columns)
+      except ValueError:
+        pass   # not in the main thread
 
     self.redirect_dev = None
     self.redirect_filename = ''
     self.redirect_mode = ''
 
-    readline.set_completer_delims(DELIMS)
+    self._complete_cache = {}
+    self._neg_cache = {}
+    self._compl_last = (None, 0, None)
+
+    self._prompt_dir = None
+    self._prompt = ''
 
     self.set_prompt()
 
+  def _init_readline(self):
+    """Import and configure readline (only needed for interactive use)."""
+    if CmdShell._readline_initialized:
+      return
+    import readline
+    import rlcompleter
+    if readline.__doc__ and 'libedit' in readline.__doc__:
+      readline.parse_and_bind ("bind ^I rl_complete")
+    else:
+      readline.parse_and_bind("tab: complete")
+    readline.set_completer_delims(DELIMS)
+    CmdShell._readline_initialized = True
+
   def print(self,*args, end='\n', file=None):
     """Convenience function so you don't need to remember to put the \n
     at the end of the line.
     """
-    if file is None:
-      file = self.stdout
-    s = ' '.join(str(arg) for arg in args) + end
-    file.write(s)
+    write = (file or self.stdout).write
+    if args:
+      write(str(args[0]))
+      for arg in args[1:]:
+        write(' ')
+        write(str(arg))
+    write(end)
+
+  def _update_columns(self, signum, frame):
+    """Signal handler for SIGWINCH."""
+    self.columns = shutil.get_terminal_size().columns
 
   def set_prompt(self):
     if self.stdin == sys.stdin:
-      prompt = self._options.prompt_color + self.cur_dir + self._options.end_color + '> '
+      # only rebuild the prompt if the directory changed
+      if self.cur_dir != self._prompt_dir:
+        self._prompt_dir = self.cur_dir
+        self._prompt = (self._options.prompt_color + self.cur_dir +
+                        self._options.end_color + '> ')
+      prompt = self._prompt
       if self._options.fake_input_prompt:
         print(prompt, end='')
         self.prompt = ''
@@ -141,36 +220,34 @@ class CmdShell(cmd.Cmd):
 
   def _escape(self,str):
     """Precede all special characters with a backslash."""
-    out = ''
-    for char in str:
-      if char in '\\ ':
-        out += '\\'
-      out += char
-    return out
+    return str.translate(_ESCAPE_TABLE)
 
   def _unescape(self,str):
     """Undoes the effects of the escape() function."""
-    out = ''
-    prev_backslash = False
-    for char in str:
-      if not prev_backslash and char == '\\':
-        prev_backslash = True
-        continue
-      out += char
-      prev_backslash = False
-    return out
+    return _UNESCAPE_RE.sub(r'\1', str)
 
-  def filename_complete(self, text, line, begidx, endidx):
+  def filename_complete(self, text, line, begidx, endidx, dirs_only=False):
     """Wrapper for catching exceptions since cmd seems to silently
       absorb them.
     """
+    # readline asks again for the same line on every TAB
+    key = (line[:endidx], begidx, dirs_only)
+    now = time.monotonic()
+    last_key, last_time, last_result = self._compl_last
+    if key == last_key and now - last_time < COMPLETE_CACHE_TTL:
+      return last_result
     try:
-      return self.real_filename_complete(text, line, begidx, endidx)
+      result = self.real_filename_complete(text, line, begidx, endidx,
+                                           dirs_only)
     except:
-      self._options.debug and traceback.print_exc()
+      self._debug and traceback.print_exc()
+      return None
+    self._compl_last = (key, now, result)
+    return result
 
-  def real_filename_complete(self, text, line, begidx, endidx):
-    """Figure out what filenames match the completion."""
+  def real_filename_complete(self, text, line, begidx, endidx,
+                             dirs_only=False):
+    """Figure out what filenames (or only directories) match the completion."""
 
     # line contains the full command line that's been entered so far.
     # text contains the portion of the line that readline is trying to complete
@@ -187,9 +264,9 @@ class CmdShell(cmd.Cmd):
       # This happens when you hit TAB on an empty filename
       before_match = begidx
     else:
-      for before_match in range(begidx, 0, -1):
-        if line[before_match] in DELIMS and before_match >= 1 and line[before_match - 1] != '\\':
-          break
+      # find the last unescaped delimiter at or before begidx
+      m = _LAST_DELIM_RE.match(line, 0, begidx + 1)
+      before_match = m.end() - 1 if m and m.end() > 1 else 1
 
     # We set fixed to be the portion of the filename which is before text
     # and match is the full portion of the filename that's been entered so
@@ -198,20 +275,22 @@ class CmdShell(cmd.Cmd):
     # When we return a list of completions, the bit that we return should
     # just be the portion that we replace 'text' with.
 
-    fixed = self._unescape(line[before_match+1:begidx]) # fixed portion of the match
-    match = self._unescape(line[before_match+1:endidx]) # portion to match filenames against
+    unescape = self._unescape
+    fixed = unescape(line[before_match+1:begidx]) # fixed portion of the match
+    match = unescape(line[before_match+1:endidx]) # portion to match filenames against
 
     # We do the following to cover the case that the current directory
     # is / and the path being entered is relative.
+    cur_dir = self.cur_dir
     strip = ''
     if len(match) > 0 and match[0] == '/':
       abs_match = match
-    elif self.cur_dir == '/':
-      abs_match = self.cur_dir + match
-      strip = self.cur_dir
+    elif cur_dir == '/':
+      abs_match = cur_dir + match
+      strip = cur_dir
     else:
-      abs_match = self.cur_dir + '/' + match
-      strip = self.cur_dir + '/'
+      abs_match = cur_dir + '/' + match
+      strip = cur_dir + '/'
 
     completions = []
     prepend = ''
@@ -227,13 +306,12 @@ class CmdShell(cmd.Cmd):
         else:
           completions.append(dev.name_path[1:])
       # Add root directories of the default device (i.e. /flash/ and /sd/)
+      # (root_dirs is sorted, so the matches are a contiguous range)
       if match[0] == '/':
-        completions += [
-          root_dir for root_dir in dev.root_dirs if root_dir.startswith(match)]
+        completions += _prefix_range(dev.root_dirs, match)
       else:
         completions += [
-          root_dir[1:] for root_dir in dev.root_dirs
-                                             if root_dir[1:].startswith(match)]
+          root_dir[1:] for root_dir in _prefix_range(dev.root_dirs, '/' + match)]
     elif dev:
       # This means that there are at least 2 slashes in abs_match. If one
       # of them matches a board name then we need to remove the board
@@ -242,35 +320,80 @@ class CmdShell(cmd.Cmd):
       if abs_match.startswith(dev.name_path):
         prepend = dev.name_path[:-1]
 
-    paths = sorted(utils.auto(utils.listdir_matches, abs_match))
-    for path in paths:
+    # Listings are cached per directory, so that repeated TABs (and
+    # different prefixes within the same directory) don't trigger a
+    # round-trip to the device.
+    dev_match, dev_path = utils.get_dev_and_path(abs_match)
+    match_dir = dev_path[:dev_path.rfind('/') + 1]
+    key = (dev_match, match_dir)
+    now = time.monotonic()
+    cached = self._complete_cache.get(key)
+    if cached and now - cached[0] < COMPLETE_CACHE_TTL:
+      all_paths = cached[1]
+    elif (key in self._neg_cache and
+          now - self._neg_cache[key] < COMPLETE_NEG_CACHE_TTL):
+      # the device recently had nothing for this directory
+      all_paths = []
+    else:
+      if dev_match is None:
+        all_paths = sorted(utils.listdir_matches_local(match_dir))
+      else:
+        try:
+          all_paths = sorted(dev_match.remote_eval(utils.listdir_matches,
+                                                   match_dir))
+        except Exception:
+          # e.g. a mistyped directory, don't ask the device again
+          self._neg_cache[key] = now
+          raise
+        if not all_paths:
+          self._neg_cache[key] = now
+      self._complete_cache[key] = (now, all_paths)
+
+    # single pass over the candidates: filter, fix up and escape
+    slen = len(strip)
+    escape = self._escape
+    append = completions.append
+    for path in _prefix_range(all_paths, dev_path):
+      if dirs_only and path[-1] != '/':
+        continue
       path = prepend + path
       if path.startswith(strip):
-        path = path[len(strip):]
-      completions.append(self._escape(path.replace(fixed, '', 1)))
+        path = path[slen:]
+      if fixed:
+        path = path.replace(fixed, '', 1)
+      append(escape(path) if ' ' in path or '\\' in path else path)
     return completions
 
   def directory_complete(self, text, line, begidx, endidx):
     """Figure out what directories match the completion."""
-    return [filename for filename in self.filename_complete(text, line, begidx, endidx) if filename[-1] == '/']
+    return self.filename_complete(text, line, begidx, endidx, dirs_only=True)
 
   # --- parse line, handling redirection   -----------------------------------
 
   def line_to_args(self, line):
     """ parse line and handle redirection """
 
+    self.redirect_filename = ''
+    self.redirect_dev = None
+
+    # fast path: without quotes, escapes or redirection a plain split is
+    # all we need
+    if not any(c in line for c in '"\'\\>'):
+      return line.split()
+
     # Note: using shlex.split causes quoted substrings to stay together.
     try:
       args = shlex.split(line)
     except ValueError as err:
       raise device.DeviceError(str(err))
-    self.redirect_filename = ''
-    self.redirect_dev = None
+    if '>' not in line:
+      # quoted arguments, but no redirection
+      return args
     redirect_index = -1
-    if '>' in args:
-      redirect_index = args.index('>')
-    elif '>>' in args:
-      redirect_index = args.index('>>')
+    for idx, arg in enumerate(args):
+      if arg == '>' or arg == '>>':
+        redirect_index = idx
+        break
     if redirect_index >= 0:
       if redirect_index + 1 >= len(args):
         raise CmdShellError("> requires a filename")
@@ -282,11 +405,11 @@ class CmdShell(cmd.Cmd):
                          self.redirect_filename)
       if args[redirect_index] == '>':
         self.redirect_mode = 'w'
-        if self._options.debug:
+        if self._debug:
           print('Redirecting (write) to', self.redirect_filename)
       else:
         self.redirect_mode = 'a'
-        if self._options.debug:
+        if self._debug:
           print('Redirecting (append) to', self.redirect_filename)
       self.redirect_dev, self.redirect_filename = (
         utils.get_dev_and_path(self.redirect_filename))
@@ -294,9 +417,11 @@ class CmdShell(cmd.Cmd):
         if self.redirect_dev is None:
           self.stdout = SmartFile(open(self.redirect_filename, self.redirect_mode))
         else:
-          # Redirecting to a remote device. We collect the results locally
+          # Redirecting to a remote device. We collect the results in memory
           # and copy them to the remote device at the end of the command.
-          self.stdout = SmartFile(tempfile.TemporaryFile(mode='w+'))
+          self.stdout = SmartFile(io.TextIOWrapper(io.BytesIO(),
+                                                   encoding='utf-8',
+                                                   write_through=True))
       except OSError as err:
         raise CmdShellError(err)
 
@@ -308,8 +433,26 @@ class CmdShell(cmd.Cmd):
 
   def precmd(self, line):
     self.stdout = self.smart_stdout
+    self._compl_last = (None, 0, None)
+    self._invalidate_complete_cache(line)
     return line
 
+  def _invalidate_complete_cache(self, line):
+    """Clear cached listings if line might modify the filesystem."""
+    if not self._complete_cache and not self._neg_cache:
+      return
+    if '>' in line or any(self._is_mutating(cmd)
+                          for cmd in line.replace('\\;', '').split(';')):
+      self._complete_cache.clear()
+      self._neg_cache.clear()
+
+  def _is_mutating(self, cmd):
+    """Check if the command (not its arguments) might modify files."""
+    words = cmd.split(None, 1)
+    if not words:
+      return False
+    return words[0].startswith('!') or words[0] in MUTATING_CMDS
+
   def onecmd(self, line):
     """Override onecmd.
 
@@ -317,7 +460,7 @@ class CmdShell(cmd.Cmd):
     2 - So we can strip comments
     3 - So we can track line numbers
     """
-    if self._options.debug:
+    if self._debug:
       print('Executing "%s"' % line)
     self.line_num += 1
     if line == "EOF" or line == 'exit':
@@ -326,6 +469,11 @@ class CmdShell(cmd.Cmd):
         # print a newline to pretty things up for the caller.
         self.print('')
       return True
+
+    # fast path: a single command without comments
+    if ';' not in line and '#' not in line:
+      return self.onecmd_exec(line)
+
     # Strip comments
     comment_idx = line.find("#")
     if comment_idx >= 0:
@@ -333,32 +481,39 @@ class CmdShell(cmd.Cmd):
       line = line.strip()
 
     # search multiple commands on the same line
-    # hide escaped semicolon from lexer
-    line = line.replace('\;','\x00')
-    lexer = shlex.shlex(line)
-    lexer.whitespace = ''
+    # hide escaped semicolon from splitting
+    line = line.replace('\\;','\x00')
+    if '"' in line or "'" in line:
+      # semicolons within quotes don't separate commands, use the lexer
+      lexer = shlex.shlex(line)
+      lexer.whitespace = ''
+      cmds = ["".join(group) for issemicolon, group in
+              itertools.groupby(lexer, lambda x: x == ";") if not issemicolon]
+    else:
+      cmds = line.split(';')
 
-    for issemicolon, group in itertools.groupby(lexer, lambda x: x == ";"):
-      if not issemicolon:
+    for single_cmd in cmds:
+      if single_cmd.strip():
         # resurrect hidden semicolon if necessary
-        single_cmd = "".join(group).replace('\x00',';')
-        self.onecmd_exec(single_cmd)
+        self.onecmd_exec(single_cmd.replace('\x00',';'))
 
   def postcmd(self, stop, line):
     if self.stdout != self.smart_stdout:
       if self.redirect_dev is not None:
         # Redirecting to a remote device, now that we're finished the
         # command, we can copy the collected output to the remote.
-        if self._options.debug:
+        if self._debug:
           print('Copy redirected output to "%s"' % self.redirect_filename)
         # This belongs on the remote. Copy/append now
-        filesize = self.stdout.tell()
-        self.stdout.seek(0)
+        filesize = self.stdout.file.buffer.tell()
+        self.stdout.file.buffer.seek(0)
         self.redirect_dev.remote(utils.recv_file_from_host, self.stdout,
                                  self.redirect_filename,
                                  filesize, self._options.buffer_size,
                                  dst_mode=self.redirect_mode,
                                  xfer_func=utils.send_file_to_remote)
+        # a new file in the root directory of the device is cached
+        self.redirect_dev.update_root_dir(self.redirect_filename, True)
       self.stdout.close()
     self.stdout = self.real_stdout
     if not stop:
@@ -384,7 +539,7 @@ class CmdShell(cmd.Cmd):
       return False
     except Exception as err:
       utils.print_err(err)
-      self._options.debug and traceback.print_exc()
+      self._debug and traceback.print_exc()
 
   # --- list of command-names   ----------------------------------------------
 
@@ -409,7 +564,7 @@ class CmdShell(cmd.Cmd):
       cmdinstance = Command.create(cmd,self)
       return cmdinstance.complete(text,line,begidx,endidx)
     except:
-      self._options.debug and print(traceback.print_exc())
+      self._debug and print(traceback.print_exc())
       utils.print_err("Unrecognized command:",line)
       raise
 
@@ -436,11 +591,11 @@ class CmdShell(cmd.Cmd):
     try:
       cmdinstance = Command.create(cmd,self)
     except:
-      self._options.debug and print(traceback.print_exc())
+      self._debug and print(traceback.print_exc())
       utils.print_err("Unrecognized command:",line)
       return
 
-    if self._options.debug:
+    if self._debug:
       print(f"DEBUG: default(): {line=}")
       print(f"DEBUG: default(): {cmd=}")
       print(f"DEBUG: default(): {args=}")
@@ -455,4 +610,6 @@ class CmdShell(cmd.Cmd):
       stop = self.onecmd(line)
       stop = self.postcmd(stop, line)
     else:
+      if self.use_rawinput:
+        self._init_readline()
       cmd.Cmd.cmdloop(self)
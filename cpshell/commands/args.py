@@ -11,8 +11,6 @@
 # ----------------------------------------------------------------------------
 
 from .command import Command 
-from cpshell import utils
-from cpshell import device
 
 class Args(Command):
 
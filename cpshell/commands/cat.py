@@ -10,22 +10,59 @@
 # Website: https://github.com/bablokb/cp-shell
 # ----------------------------------------------------------------------------
 
+import os
+
 from cpshell.options import Options
 from cpshell import utils
-from cpshell import device
 
 from .command import Command 
 from .filesize import get_filesize
 
-def cat(src_filename, dst_file):
-  """Copies the contents of the indicated file to an already opened file."""
+CAT_BUF_SIZE = 65536    # read-size for local files
+
+def _sendfile(src_file, dst_file):
+  """Copies a local file to dst_file within the kernel, if dst_file is
+    backed by a real file descriptor. Returns False if this is not possible
+    (src_file is then positioned after the data already copied).
+  """
+  if not hasattr(os, 'sendfile'):
+    return False
+  try:
+    dst_fd = dst_file.fileno()
+  except (AttributeError, OSError):
+    return False
+  dst_file.flush()
+  src_fd = src_file.fileno()
+  size = os.fstat(src_fd).st_size
+  offset = 0
+  try:
+    while offset < size:
+      sent = os.sendfile(dst_fd, src_fd, offset, size - offset)
+      if not sent:
+        break
+      offset += sent
+  except OSError:
+    src_file.seek(offset)
+    return False
+  return True
+
+def cat(src_filename, dst_file, filesize=None):
+  """Copies the contents of the indicated file to an already opened file.
+    For remote files, filesize is queried if not passed in.
+  """
   (dev, dev_filename) = utils.get_dev_and_path(src_filename)
   if dev is None:
     with open(dev_filename, 'rb') as txtfile:
-      for line in txtfile:
-        dst_file.write(line)
+      if _sendfile(txtfile, dst_file):
+        return
+      while True:
+        buf = txtfile.read(CAT_BUF_SIZE)
+        if not buf:
+          break
+        dst_file.write_bytes(buf)
   else:
-    filesize = dev.remote_eval(get_filesize, dev_filename)
+    if filesize is None:
+      filesize = dev.remote_eval(get_filesize, dev_filename)
     return dev.remote(utils.send_file_to_host, dev_filename, dst_file,
                       filesize, Options.get().buffer_size,
                       xfer_func=utils.recv_file_from_remote)
@@ -49,13 +86,18 @@ class Cat(Command):
     #       to write stdin to a temp file, and then copy the file
     #       since we need to know the filesize when copying to the board.
 
-    for filename in args:
-      filename = utils.resolve_path(filename,self.shell.cur_dir)
-      mode = utils.auto(utils.get_mode, filename)
+    filenames = [utils.resolve_path(filename,self.shell.cur_dir)
+                   for filename in args]
+
+    # query mode and size of all remote files with a single call
+    stats = utils.auto_modes_sizes(filenames)
+
+    for filename in filenames:
+      mode, filesize = stats[filename]
       if not utils.mode_exists(mode):
         utils.print_err("Cannot access '%s': No such file" % filename)
         continue
       if not utils.mode_isfile(mode):
         utils.print_err("'%s': is not a file" % filename)
         continue
-      cat(filename, self.shell.stdout)
+      cat(filename, self.shell.stdout, filesize)
@@ -11,11 +11,15 @@
 # ----------------------------------------------------------------------------
 
 import argparse
+import importlib
+
+from cpshell.options import Options
 
 class Command:
 
   # cache-objects
   _cmd_obj = {}
+  _cmd_classes = {}
   _cmd_list = []
 
   # --- return command-object (create if not already cached)    --------------
@@ -23,12 +27,25 @@ class Command:
   @classmethod
   def create(cls,name,shell):
     """ create an instance of the command """
-    if not name in Command._cmd_obj:
-      cmdmodule   = __import__(name,
-                               globals(),locals(),[name.capitalize()],1)
-      obj = getattr(cmdmodule,name.capitalize())(shell)
+    obj = Command._cmd_obj.get(name)
+    if obj is None:
+      obj = cls.get_class(name)(shell)
       Command._cmd_obj[name] = obj
-    return Command._cmd_obj[name]
+    return obj
+
+  # --- return command-class (import module if not already cached)   ---------
+
+  @classmethod
+  def get_class(cls,name):
+    """ return the class implementing the command """
+    cmd_class = Command._cmd_classes.get(name)
+    if cmd_class is None:
+      if name not in cls.all_commands():
+        raise KeyError(f"unknown command: {name}")
+      cmdmodule = importlib.import_module('.'+name,__package__)
+      cmd_class = getattr(cmdmodule,name.capitalize())
+      Command._cmd_classes[name] = cmd_class
+    return cmd_class
 
   # --- return list of all commands   ----------------------------------------
 
@@ -39,8 +56,7 @@ class Command:
       from cpshell import commands
       import pkgutil
       Command._cmd_list = [
-         mod.name for mod in
-             list(pkgutil.iter_modules(commands.__path__))
+         mod.name for mod in pkgutil.iter_modules(commands.__path__)
                 if mod.name != "command"]
     return Command._cmd_list
 
@@ -50,26 +66,48 @@ class Command:
     """ constructor """
     self.shell  = shell
     self._name  = name
-    self._create_argparser()
+    self._options = Options.get()
+    self._parser = None
+
+  # --- argparser (created on first access)   --------------------------------
+
+  @property
+  def parser(self):
+    """ argparser of the command (created on first access) """
+    if self._parser is None:
+      self._create_argparser()
+    return self._parser
+
+  # --- parse usage and description from run() (once per class)   -----------
+
+  @classmethod
+  def _parser_spec(cls):
+    """ return (usage, description) from the docstring of run() """
+    spec = cls.__dict__.get('_spec')
+    if spec is None:
+      doc_lines = cls.run.__doc__.expandtabs().splitlines()
+      if not doc_lines[0]:
+        doc_lines.pop(0)
+        doc_lines[0] = "\n"+doc_lines[0]
+      if '' in doc_lines:
+        blank_idx = doc_lines.index('')
+        usage = doc_lines[:blank_idx]
+        description = doc_lines[blank_idx+1:]
+      else:
+        usage = doc_lines
+        description = []
+      spec = ('\n'.join(usage), '\n'.join(description))
+      cls._spec = spec
+    return spec
 
   # --- create argparser from comments within run()   ------------------------
 
   def _create_argparser(self):
-    doc_lines = getattr(self, "run").__doc__.expandtabs().splitlines()
-    if not doc_lines[0]:
-      doc_lines.pop(0)
-      doc_lines[0] = "\n"+doc_lines[0]
-    if '' in doc_lines:
-      blank_idx = doc_lines.index('')
-      usage = doc_lines[:blank_idx]
-      description = doc_lines[blank_idx+1:]
-    else:
-      usage = doc_lines
-      description = []
-    self.parser = argparse.ArgumentParser(
+    usage, description = self._parser_spec()
+    self._parser = argparse.ArgumentParser(
         prog=self._name,
-        usage='\n'.join(usage),
-        description='\n'.join(description)
+        usage=usage,
+        description=description
     )
     self.add_args()
 
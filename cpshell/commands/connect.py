@@ -12,7 +12,6 @@
 
 from .command import Command 
 from cpshell import utils
-from cpshell import device
 
 class Connect(Command):
 
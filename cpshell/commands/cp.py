@@ -12,6 +12,8 @@
 
 import os
 import time
+import shutil
+import stat
 
 from cpshell.options import Options
 from cpshell import utils
@@ -21,54 +23,119 @@ from .command import Command
 from .filesize import get_filesize
 from .mkdir import mkdir
 
-def copy_file(src_filename, dst_filename, buf_size):
+def copy_file(src_filename, dst_filename, buf_size, filesize=-1):
   """Copies a file from one place to another. Both the source and destination
-    files must exist on the same machine.
+    files must exist on the same machine. Files with a known size of at most
+    buf_size are copied with a single read.
   """
   try:
+    if 0 <= filesize <= buf_size:
+      with open(src_filename, 'rb') as src_file:
+        with open(dst_filename, 'wb') as dst_file:
+          dst_file.write(src_file.read())
+      return True
+    buf = bytearray(buf_size)
+    mv = memoryview(buf)
     with open(src_filename, 'rb') as src_file:
       with open(dst_filename, 'wb') as dst_file:
         while True:
-          buf = src_file.read(buf_size)
-          if len(buf) > 0:
-            dst_file.write(buf)
-          if len(buf) < buf_size:
+          n = src_file.readinto(mv)
+          if not n:
             break
+          dst_file.write(mv if n == buf_size else mv[:n])
     return True
   except:
     return False
 
-def cp(src_filename, dst_filename):
+def cp(src_filename, dst_filename, filesize=None, buf_size=None):
   """Copies one file to another. The source file may be local or remote and
-    the destination file may be local or remote.
+    the destination file may be local or remote. The size of the source
+    file is queried if not passed in.
   """
   src_dev, src_dev_filename = utils.get_dev_and_path(src_filename)
   dst_dev, dst_dev_filename = utils.get_dev_and_path(dst_filename)
 
-  Options.get().verbose and print(f"cp {src_filename} {dst_filename}")
+  options = Options.get()
+  if buf_size is None:
+    buf_size = options.buffer_size
+  options.verbose and print(f"cp {src_filename} {dst_filename}")
+  utils.update_root_dirs(dst_filename, True)
   if src_dev is dst_dev:
     # src and dst are either on the same remote, or both are on the host
+    if src_dev is None:
+      # shutil uses os.sendfile (or similar) where available
+      try:
+        shutil.copyfile(src_dev_filename, dst_dev_filename)
+        return True
+      except OSError:
+        return False
     return utils.auto(copy_file, src_filename,
-                      dst_dev_filename,
-                      Options.get().buffer_size)
+                      dst_dev_filename, buf_size,
+                      -1 if filesize is None else filesize)
 
-  filesize = utils.auto(get_filesize, src_filename)
+  if filesize is None:
+    filesize = utils.auto(get_filesize, src_filename)
 
   if dst_dev is None:
     # Copying from remote to host
     with open(dst_dev_filename, 'wb') as dst_file:
       return src_dev.remote(utils.send_file_to_host,
                             src_dev_filename, dst_file,
-                            filesize, Options.get().buffer_size,
+                            filesize, buf_size,
                             xfer_func=utils.recv_file_from_remote)
   if src_dev is None:
     # Copying from host to remote
     with open(src_dev_filename, 'rb') as src_file:
       return dst_dev.remote(utils.recv_file_from_host,
                             src_file, dst_dev_filename,
-                            filesize, Options.get().buffer_size,
+                            filesize, buf_size,
                             xfer_func=utils.send_file_to_remote)
 
+def cp_to_remote(files, buf_size):
+  """Copies multiple files from the host to the device with a single remote
+    call. files is a list of (src_filename, dst_filename, filesize) tuples.
+  """
+  options = Options.get()
+  src_filenames = []
+  dst_filenames = []
+  filesizes = []
+  for src_filename, dst_filename, filesize in files:
+    options.verbose and print(f"cp {src_filename} {dst_filename}")
+    src_filenames.append(utils.get_dev_and_path(src_filename)[1])
+    dst_filenames.append(utils.get_dev_and_path(dst_filename)[1])
+    filesizes.append(filesize)
+  dev = device.Device.get_device()
+  # the board only needs the destinations, the sources are read on the host
+  output = dev.remote(utils.recv_files_from_host,
+                      dst_filenames, filesizes, buf_size,
+                      xfer_func=lambda dev, *args:
+                        utils.send_files_to_remote(dev, src_filenames, *args))
+  # new files in the root directory are added to the cached root listing
+  for dst_filename in dst_filenames:
+    dev.update_root_dir(dst_filename, True)
+  return output.strip().endswith(b'True')
+
+def cp_from_remote(files, buf_size):
+  """Copies multiple files from the device to the host with a single remote
+    call. files is a list of (src_filename, dst_filename, filesize) tuples.
+  """
+  options = Options.get()
+  src_filenames = []
+  dst_filenames = []
+  filesizes = []
+  for src_filename, dst_filename, filesize in files:
+    options.verbose and print(f"cp {src_filename} {dst_filename}")
+    src_filenames.append(utils.get_dev_and_path(src_filename)[1])
+    dst_filenames.append(utils.get_dev_and_path(dst_filename)[1])
+    filesizes.append(filesize)
+  dev = device.Device.get_device()
+  # the board only needs the sources, the destinations are written on the host
+  output = dev.remote(utils.send_files_to_host,
+                      src_filenames, filesizes, buf_size,
+                      xfer_func=lambda dev, src_filenames, *args:
+                        utils.recv_files_from_remote(dev, src_filenames,
+                                                     dst_filenames, *args))
+  return output.strip().endswith(b'True')
 
 class Cp(Command):
 
@@ -120,17 +187,20 @@ class Cp(Command):
     """
 
     time_offset = -time.localtime().tm_gmtoff
+    buf_size = self._options.buffer_size
+    cur_dir = self.shell.cur_dir
     args = self.parser.parse_args(args)
     src_filenames = args.filenames[:-1]
 
     if len(args.filenames) < 2:
       utils.print_err('Missing destination file')
       return
-    dst_dirname = utils.resolve_path(args.filenames[-1],self.shell.cur_dir)
+    dst_dirname = utils.resolve_path(args.filenames[-1],cur_dir)
 
     dst_mode = utils.auto(utils.get_mode, dst_dirname)
     d_dst = {}  # Destination directory: lookup stat by basename
     if args.recursive:
+      from .rsync import rsync # do it here to prevent circular imports!
       dst_files = utils.auto(utils.listdir_stat,dst_dirname,time_offset)
       if dst_files is None:
         if utils.is_pattern(src_filenames[0]):
@@ -139,11 +209,10 @@ class Cp(Command):
         if not mkdir(dst_dirname):
           utils.print_err(f"Unable to create directory {dst_dirname}")
           return
-        dst_mode = utils.auto(utils.get_mode, dst_dirname)
+        dst_mode = stat.S_IFDIR
         src_filenames[0] += '/*'
       else:
-        for name, stat in dst_files:
-          d_dst[name] = stat
+        d_dst = dict(dst_files)
 
     # Process PATTERN
     sfn = src_filenames[0]
@@ -151,49 +220,85 @@ class Cp(Command):
       if len(src_filenames) > 1:
         utils.print_err("Usage: cp [-r] PATTERN DIRECTORY")
         return
-      src_filenames = utils.process_pattern(sfn,self.shell.cur_dir)
+      src_filenames = utils.process_pattern(sfn,cur_dir)
       if src_filenames is None:
         return
 
+    resolved = []
     for src_filename in src_filenames:
       if utils.is_pattern(src_filename):
         utils.print_err("Only one pattern permitted.")
         return
-      src_filename = utils.resolve_path(src_filename,self.shell.cur_dir)
+      src_filename = utils.resolve_path(src_filename,cur_dir)
       if '__pycache__' in src_filename:              # don't copy __pycache__
         continue
-      src_mode = utils.auto(utils.get_mode, src_filename)
+      resolved.append(src_filename)
+
+    # query all sources at once instead of one round-trip per file
+    src_stats = utils.auto_modes_sizes(resolved)
+
+    # the target of plain files only depends on the type of the destination
+    if utils.mode_isdir(dst_mode):
+      dst_prefix = dst_dirname.rstrip('/') + '/'    # ':/' stays ':/'
+    else:
+      dst_prefix = None
+
+    # files from the host to the device are collected and sent together
+    to_remote = utils.get_dev_and_path(dst_dirname)[0] is not None
+    batch = []
+
+    for src_filename in resolved:
+      src_mode, src_size = src_stats[src_filename]
       if not utils.mode_exists(src_mode):
-        utils.print_err("File '{}' doesn't exist".format(src_filename))
-        return
+        utils.print_err(f"File '{src_filename}' doesn't exist")
+        break
       if utils.mode_isdir(src_mode):
         if args.recursive: # Copying a directory
+          if not self._flush_batch(batch, buf_size):
+            break
           src_basename = os.path.basename(src_filename)
           dst_filename = dst_dirname + '/' + src_basename
           if src_basename in d_dst:
             dst_stat = d_dst[src_basename]
             dst_mode = utils.stat_mode(dst_stat)
             if not utils.mode_isdir(dst_mode):
-              err = "Destination {} is not a directory"
-              utils.print_err(err.format(dst_filename))
-              return
+              utils.print_err(f"Destination {dst_filename} is not a directory")
+              break
           else:
             if not mkdir(dst_filename):
-              err = "Unable to create directory {}"
-              utils.print_err(err.format(dst_filename))
-              return
+              utils.print_err(f"Unable to create directory {dst_filename}")
+              break
 
-          from .rsync import rsync # do it here to prevent circular imports!
           rsync(src_filename, dst_filename, mirror=False, dry_run=False,
                 print_func=lambda *args: None, recursed=False, sync_hidden=args.all)
         else:
-          utils.print_err("Omitting directory {}".format(src_filename))
+          utils.print_err(f"Omitting directory {src_filename}")
         continue
-      if utils.mode_isdir(dst_mode):
-        dst_filename = dst_dirname + '/' + os.path.basename(src_filename)
+      if dst_prefix is not None:
+        dst_filename = dst_prefix + src_filename.rpartition('/')[2]
       else:
         dst_filename = dst_dirname
-      if not cp(src_filename, dst_filename):
-        err = "Unable to copy '{}' to '{}'"
-        utils.print_err(err.format(src_filename, dst_filename))
+      if to_remote and utils.get_dev_and_path(src_filename)[0] is None:
+        batch.append((src_filename, dst_filename, src_size))
+        continue
+      if not self._flush_batch(batch, buf_size):
+        break
+      if not cp(src_filename, dst_filename, src_size, buf_size):
+        utils.print_err(f"Unable to copy '{src_filename}' to '{dst_filename}'")
         break
+    self._flush_batch(batch, buf_size)
+
+  # --- copy collected files to the device   ---------------------------------
+
+  def _flush_batch(self, batch, buf_size):
+    """ copy and clear the collected files, return False on errors """
+    if not batch:
+      return True
+    result = cp_to_remote(batch, buf_size)
+    if not result:
+      if len(batch) == 1:
+        utils.print_err(f"Unable to copy '{batch[0][0]}' to '{batch[0][1]}'")
+      else:
+        utils.print_err(f"Unable to copy {len(batch)} files to the device")
+    batch.clear()
+    return result
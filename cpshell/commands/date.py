@@ -12,10 +12,8 @@
 
 import sys
 import time
-from datetime import datetime
 
 from .command import Command 
-from cpshell import utils
 from cpshell import device
 
 # --- helper functions   -----------------------------------------------------
@@ -42,7 +40,7 @@ class Date(Command):
     dev = device.Device.get_device()
     if dev:
       time_offset = -time.localtime().tm_gmtoff
-      dt = datetime.fromtimestamp(dev.remote_eval(date)+time_offset)
+      now = time.localtime(dev.remote_eval(date)+time_offset)
     else:
-      dt = datetime.now()
-    self.shell.print(f'{dt.strftime("%c")}')
+      now = time.localtime()
+    self.shell.print(time.strftime("%c", now))
@@ -15,8 +15,6 @@ import tempfile
 import os
 
 from cpshell import utils
-from cpshell import device
-from cpshell.options import Options
 
 from .command import Command 
 from .cp import cp
@@ -51,26 +49,27 @@ class Edit(Command):
       return
     filename = utils.resolve_path(args[0],self.shell.cur_dir)
     dev, dev_filename = utils.get_dev_and_path(filename)
-    mode = utils.auto(utils.get_mode, filename)
+    # mode and size with one call, cp() then needs no extra round-trip
+    mode, filesize = utils.auto_modes_sizes([filename])[filename]
     if utils.mode_exists(mode) and utils.mode_isdir(mode):
-      utils.print_err("Unable to edit directory '{}'".format(filename))
+      utils.print_err(f"Unable to edit directory '{filename}'")
       return
     if dev is None:
       # File is local
-      os.system("{} '{}'".format(Options.get().editor, filename))
+      os.system(f"{self._options.editor} '{filename}'")
     else:
       # File is remote
       with tempfile.TemporaryDirectory() as temp_dir:
         local_filename = os.path.join(temp_dir, os.path.basename(filename))
         if utils.mode_exists(mode):
-          Options.get().verbose and self.shell.print(f"Retrieving {filename} ...")
-          cp(filename, local_filename)
+          self._options.verbose and self.shell.print(f"Retrieving {filename} ...")
+          cp(filename, local_filename, filesize)
         old_mtime = utils.stat_mtime(utils.get_stat(local_filename,time_offset))
-        if os.system("{} '{}'".format(Options.get().editor, local_filename)) == 0:
+        if os.system(f"{self._options.editor} '{local_filename}'") == 0:
           new_mtime = utils.stat_mtime(utils.get_stat(local_filename,time_offset))
-          if Options.get().debug:
+          if self._options.debug:
             print(f"DEBUG: mtime(old)={utils.mtime_pretty(old_mtime)}")
             print(f"DEBUG: mtime(new)={utils.mtime_pretty(new_mtime)}")
           if new_mtime > old_mtime:
-            Options.get().verbose and self.shell.print(f"Updating {filename} ...")
-            cp(local_filename, filename)
+            self._options.verbose and self.shell.print(f"Updating {filename} ...")
+            cp(local_filename, filename, os.path.getsize(local_filename))
@@ -12,7 +12,6 @@
 
 from .command import Command 
 from cpshell import utils
-from cpshell import device
 
 def get_filesize(filename):
   """Returns the size of a file, in bytes."""
@@ -42,7 +41,7 @@ class Filesize(Command):
     for testing.
     """
     if len(args) == 0:
-      print_err("Must provide a filename")
+      utils.print_err("Must provide a filename")
       return
     filename = utils.resolve_path(args[0],self.shell.cur_dir)
     self.shell.print(utils.auto(get_filesize, filename))
@@ -14,7 +14,6 @@ import traceback
 
 from cpshell.commands.command import Command
 from cpshell import utils
-from cpshell import device
 
 class Help(Command):
 
@@ -39,9 +38,9 @@ class Help(Command):
 
       self.shell.print("="*20)
       self.shell.print("Available commands:")
+      # all_commands() is cached and already excludes the base module
       for cmd in Command.all_commands():
-        if cmd != "command":
-          self.shell.print(f"  {cmd}")
+        self.shell.print(f"  {cmd}")
       self.shell.print("="*20)
       return
 
@@ -50,5 +49,5 @@ class Help(Command):
       cmd = Command.create(args[0],self.shell)
       cmd.parser.print_help()
     except:
-      self.shell._options.debug and traceback.print_exc()
+      self._options.debug and traceback.print_exc()
       utils.print_err(f"no help for {args[0]} - unknown command?!")
@@ -10,53 +10,48 @@
 # Website: https://github.com/bablokb/cp-shell
 # ----------------------------------------------------------------------------
 
+import re
 import time
-from datetime import datetime
 import fnmatch
 
 from .command import Command 
 from cpshell import utils
-from cpshell import device
 
 # --- helper functions   -----------------------------------------------------
 
 SIX_MONTHS = 183 * 24 * 60 * 60
 
-def print_long(filename, stat, print_func):
-  """Prints detailed information about the file passed in."""
+def print_long(filename, stat, print_func, curr_time):
+  """Prints detailed information about the file passed in. Files older
+  (or newer) than six months from curr_time are shown with the year.
+  """
   size = utils.stat_size(stat)
   mtime = utils.stat_mtime(stat)
-  curr_time = time.time()
-  file_dt = datetime.fromtimestamp(mtime)
-  file_pretty = utils.decorated_filename(filename, stat)
-  if mtime > (curr_time + SIX_MONTHS) or mtime < (curr_time - SIX_MONTHS):
-    print_func(f"{size:6d} {file_dt.strftime('%b %d %Y')} {file_pretty}")
+  # strftime: the month names follow the locale
+  if abs(mtime - curr_time) > SIX_MONTHS:
+    file_date = time.strftime('%b %d %Y', time.localtime(mtime))
   else:
-    print_func(f"{size:6d} {file_dt.strftime('%b %d %H:%M')} {file_pretty}")
-
-def word_len(word):
-  """Returns the word length, minus any color codes."""
-  if word[0] == '\x1b':
-    return len(word) - 11   # 7 for color, 4 for no-color
-  return len(word)
+    file_date = time.strftime('%b %d %H:%M', time.localtime(mtime))
+  print_func(f"{size:6d} {file_date} {utils.decorated_filename(filename, stat)}")
 
 def print_cols(words, print_func, termwidth=79):
   """Takes a single column of words, and prints it as multiple columns that
   will fit in termwidth columns.
   """
-  width = max([word_len(word) for word in words])
+  # colored words carry 11 chars of escape codes (7 for color, 4 for no-color)
+  if any(word[0] == '\x1b' for word in words):
+    pads = [11 if word[0] == '\x1b' else 0 for word in words]
+    width = max(len(word) - pad for word, pad in zip(words, pads))
+  else:
+    pads = None
+    width = max(map(len, words))
   nwords = len(words)
   ncols = max(1, (termwidth + 1) // (width + 1))
   nrows = (nwords + ncols - 1) // ncols
   for row in range(nrows):
     for i in range(row, nwords, nrows):
-      word = words[i]
-      if word[0] == '\x1b':
-        print_func('%-*s' % (width + 11, words[i]),
-                   end='\n' if i + nrows >= nwords else ' ')
-      else:
-        print_func('%-*s' % (width, words[i]),
-                   end='\n' if i + nrows >= nwords else ' ')
+      print_func('%-*s' % (width if pads is None else width + pads[i], words[i]),
+                 end='\n' if i + nrows >= nwords else ' ')
 
 
 class Ls(Command):
@@ -105,6 +100,7 @@ class Ls(Command):
 
     args = self.parser.parse_args(args)
     time_offset = -time.localtime().tm_gmtoff
+    curr_time = time.time()
     if len(args.filenames) == 0:
       args.filenames = ['.']
     for idx, fn in enumerate(args.filenames):
@@ -118,7 +114,7 @@ class Ls(Command):
           continue
         if not utils.mode_isdir(mode):
           if args.long:
-            print_long(fn, stat, self.shell.print)
+            print_long(fn, stat, self.shell.print, curr_time)
           else:
             self.shell.print(fn)
           continue
@@ -128,7 +124,7 @@ class Ls(Command):
           self.shell.print(f"{filename}:")
         pattern = '*'
       else: # A pattern was specified
-        filename, pattern = validate_pattern(fn,self.shell.cur_dir)
+        filename, pattern = utils.validate_pattern(fn,self.shell.cur_dir)
         if filename is None: # An error was printed
           continue
       files = []
@@ -137,13 +133,22 @@ class Ls(Command):
         utils.print_err(
           f"Cannot access '{filename}': No such file or directory")
       else:
-        for filename, stat in sorted(ldir_stat,
-                                     key=lambda entry: entry[0]):
+        # compile the pattern once, '*' matches everything anyway
+        if pattern == '*':
+          pat_match = None
+        else:
+          pat_match = re.compile(fnmatch.translate(pattern)).match
+        # short listings are sorted once after decoration (which groups
+        # colored names), long listings by filename
+        if args.long:
+          ldir_stat = sorted(ldir_stat, key=lambda entry: entry[0])
+        for filename, stat in ldir_stat:
           if utils.is_visible(filename) or args.all:
-            if fnmatch.fnmatch(filename, pattern):
+            if pat_match is None or pat_match(filename):
               if args.long:
-                print_long(filename, stat, self.shell.print)
+                print_long(filename, stat, self.shell.print, curr_time)
               else:
                 files.append(utils.decorated_filename(filename, stat))
       if len(files) > 0:
-        print_cols(sorted(files), self.shell.print, self.shell.columns)
+        files.sort()
+        print_cols(files, self.shell.print, self.shell.columns)
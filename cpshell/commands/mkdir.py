@@ -12,7 +12,6 @@
 
 from .command import Command 
 from cpshell import utils
-from cpshell import device
 
 def make_directory(dirname):
   """Creates one or more directories."""
@@ -25,7 +24,10 @@ def make_directory(dirname):
 
 def mkdir(filename):
   """Creates a directory."""
-  return utils.auto(make_directory, filename)
+  result = utils.auto(make_directory, filename)
+  if result:
+    utils.update_root_dirs(filename, True)
+  return result
 
 class Mkdir(Command):
 
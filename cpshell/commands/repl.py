@@ -12,6 +12,7 @@
 
 import time
 import threading
+import serial
 
 from cpshell.getch import getch
 from cpshell import utils
@@ -22,25 +23,6 @@ from .command import Command
 QUIT_REPL_CHAR = 'X'
 QUIT_REPL_BYTE = bytes((ord(QUIT_REPL_CHAR) - ord('@'),))  # Control-X
 
-# --- helper-class   ----------------------------------------------------------
-
-class AutoBool(object):
-  """A simple class which allows a boolean to be set to False in conjunction
-    with a with: statement.
-  """
-
-  def __init__(self):
-    self.value = False
-
-  def __enter__(self):
-    self.value = True
-
-  def __exit__(self, type, value, traceback):
-    self.value = False
-
-  def __call__(self):
-    return self.value
-
 # --- command class for repl   -----------------------------------------------
 
 class Repl(Command):
@@ -57,37 +39,41 @@ class Repl(Command):
     """Runs as a thread which has a sole purpose of reading bytes from
       the serial port and writing them to stdout. Used by do_repl.
     """
-    with self._serial_reader_running:
-      try:
-        save_timeout = dev.timeout
-        # Set a timeout so that the read returns periodically with no data
-        # and allows us to check whether the main thread wants us to quit.
-        dev.timeout = 1
-        while not self._quit_serial_reader:
-          try:
-            char = dev.read(1)
-          except serial.serialutil.SerialException:
-            # This happens if the board reboots, or a USB port
-            # goes away.
-            return
-          except TypeError:
-            # This is a bug in serialposix.py starting with python 3.3
-            # which causes a TypeError during the handling of the
-            # select.error. So we treat this the same as
-            # serial.serialutil.SerialException:
-            return
-          if not char:
-            # This means that the read timed out. We'll check the quit
-            # flag and return if needed
-            if self._quit_when_no_output:
-              break
-            continue
-          self.shell.stdout.write(char)
-          self.shell.stdout.flush()
-        dev.timeout = save_timeout
-      except device.DeviceError:
-        # The device is no longer present.
-        return
+    self._serial_reader_started.set()
+    try:
+      save_timeout = dev.timeout
+      # Set a timeout so that the read returns periodically with no data
+      # and allows us to check whether the main thread wants us to quit.
+      dev.timeout = 1
+      while not self._quit_serial_reader:
+        try:
+          char = dev.read(1)
+        except serial.serialutil.SerialException:
+          # This happens if the board reboots, or a USB port
+          # goes away.
+          return
+        except TypeError:
+          # This is a bug in serialposix.py starting with python 3.3
+          # which causes a TypeError during the handling of the
+          # select.error. So we treat this the same as
+          # serial.serialutil.SerialException:
+          return
+        if not char:
+          # This means that the read timed out. We'll check the quit
+          # flag and return if needed
+          if self._quit_when_no_output:
+            break
+          continue
+        # got a byte, now take everything else that already arrived
+        waiting = dev.in_waiting
+        if waiting:
+          char += dev.read(waiting)
+        self.shell.stdout.write_bytes(char)
+        self.shell.stdout.flush()
+      dev.timeout = save_timeout
+    except device.DeviceError:
+      # The device is no longer present.
+      return
 
   # --- add arguments to parser   --------------------------------------------
 
@@ -132,23 +118,22 @@ class Repl(Command):
 
     self.shell.print('Entering REPL. Use Control-%c to exit.' % QUIT_REPL_CHAR)
     self._quit_serial_reader = False
-    self._serial_reader_running = AutoBool()
+    self._serial_reader_started = threading.Event()
     repl_thread = threading.Thread(target=self._repl_serial_to_stdout,
                                    args=(dev,), name='REPL_serial_to_stdout')
     repl_thread.daemon = True
     repl_thread.start()
-    # Wait for reader to start
-    while not self._serial_reader_running():
-      pass
+    # Wait for reader to start (without spinning and holding the GIL)
+    self._serial_reader_started.wait()
     try:
-      # Wake up the prompt
-      dev.write(b'\r')
+      # Wake up the prompt (and send the commands with the same write)
       if cmds:
         line = ' '.join(cmds).replace('~',';')
-        dev.write(bytes(line, encoding='utf-8'))
+        dev.write(b'\r' + bytes(line, encoding='utf-8') + b'\r')
+      else:
         dev.write(b'\r')
       if not self._quit_when_no_output:
-        while self._serial_reader_running():
+        while repl_thread.is_alive():
           char = getch()
           if not char:
             continue
@@ -11,7 +11,6 @@
 # ----------------------------------------------------------------------------
 
 from cpshell import utils
-from cpshell import device
 from cpshell.options import Options
 
 from .command import Command 
@@ -19,26 +18,32 @@ from .command import Command
 # --- shared low-level implementation of commands   --------------------------
 
 def remove_file(filename, recursive=False, force=False):
-  """Removes a file or directory."""
+  """Removes a file or directory. Directory trees are walked with an
+    explicit stack, a directory is removed after its contents.
+  """
   import os
-  try:
-    mode = os.stat(filename)[0]
-    if mode & 0x4000 != 0:
-      # directory
-      if recursive:
-        for file in os.listdir(filename):
-          success = remove_file(filename + '/' + file, recursive, force)
-          if not success and not force:
-            return False
-        os.rmdir(filename) # PGH Work like Unix: require recursive
-      else:
-        if not force:
-          return False
-    else:
-      os.remove(filename)
-  except:
-    if not force:
-      return False
+  # don't follow symlinks (the board has no lstat and no symlinks)
+  stat = os.lstat if hasattr(os, 'lstat') else os.stat
+  stack = [(filename, False)]
+  while stack:
+    name, emptied = stack.pop()
+    try:
+      if emptied:
+        os.rmdir(name) # PGH Work like Unix: require recursive
+        continue
+      mode = stat(name)[0]
+      if mode & 0x4000 == 0:
+        os.remove(name)
+      elif recursive:
+        # directory: revisit it for rmdir once the contents are gone
+        stack.append((name, True))
+        for file in os.listdir(name):
+          stack.append((name + '/' + file, False))
+      elif not force:
+        return False
+    except OSError:
+      if not force:
+        return False
   return True
 
 
@@ -48,7 +53,13 @@ def rm(filename, recursive=False, force=False):
     Options.get().verbose and print(f"rm -r {filename}")
   else:
     Options.get().verbose and print(f"rm {filename}")
-  return utils.auto(remove_file, filename, recursive, force)
+  result = utils.auto(remove_file, filename, recursive, force)
+  if force:
+    # success is reported even if (parts of) the file could not be removed
+    utils.invalidate_root_dirs(filename)
+  elif result:
+    utils.update_root_dirs(filename, False)
+  return result
 
 
 # --- Command-class for rm   -------------------------------------------------
@@ -111,9 +122,11 @@ class Rm(Command):
       filenames = utils.process_pattern(sfn,self.shell.cur_dir)
       if filenames is None:
         return
+    else:
+      filenames = [utils.resolve_path(filename,self.shell.cur_dir)
+                   for filename in filenames]
 
     for filename in filenames:
-      filename = utils.resolve_path(filename,self.shell.cur_dir)
       if not rm(filename, recursive=args.recursive, force=args.force):
         if not args.force:
           utils.print_err("Unable to remove '{}'".format(filename))
@@ -14,48 +14,56 @@ import time
 import os
 
 from cpshell import utils
-from cpshell import device
 from cpshell.options import Options
 
 from .command import Command 
 from .mkdir import mkdir
 from .rm import rm
 
+RSYNC_IGNORE = ('__pycache__',)   # never synced, filtered on the source side
+
 # --- shared low-level implementation of commands   --------------------------
 
-def rsync(src_dir, dst_dir, mirror, dry_run, print_func, recursed, sync_hidden):
-  """Synchronizes 2 directory trees."""
+def rsync(src_dir, dst_dir, mirror, dry_run, print_func, recursed, sync_hidden,
+          src_stat=None, dst_missing=False):
+  """Synchronizes 2 directory trees. src_stat is the stat of src_dir, if
+    already known from the listing of its parent. dst_missing is set if
+    the listing of the parent showed that dst_dir does not exist.
+  """
   # This test is a hack to avoid errors when accessing /flash. When the
   # cache synchronisation issue is solved it should be removed
   if not isinstance(src_dir, str) or not len(src_dir):
     return
   
-  from .cp import cp # do it here to prevent circular imports
+  from .cp import cp, cp_to_remote, cp_from_remote # prevent circular imports
 
   if '__pycache__' in src_dir:       # ignore __pycache__
     return
 
+  options = Options.get()
+  debug = options.debug
   time_offset = -time.localtime().tm_gmtoff
-  sstat = utils.auto(utils.get_stat, src_dir, time_offset)
-  smode = utils.stat_mode(sstat)
+  if src_stat is None:
+    src_stat = utils.auto(utils.get_stat, src_dir, time_offset)
+  smode = utils.stat_mode(src_stat)
   if utils.mode_isfile(smode):
     utils.print_err('Source {} is a file not a directory.'.format(src_dir))
     return
 
-  d_src = {}  # Look up stat tuple from name in current directory
   src_files = utils.auto(utils.listdir_stat,src_dir,
-                         time_offset,show_hidden=sync_hidden)
+                         time_offset,show_hidden=sync_hidden,
+                         ignore=RSYNC_IGNORE)
   if src_files is None:
     utils.print_err('Source directory {} does not exist.'.format(src_dir))
     return
-  for name, stat in src_files:
-    if '__pycache__' in name:       # ignore __pycache__
-      continue
-    d_src[name] = stat
+  d_src = dict(src_files)  # Look up stat tuple from name in current directory
 
   d_dst = {}
-  dst_files = utils.auto(utils.listdir_stat,dst_dir,
-                         time_offset,show_hidden=sync_hidden)
+  if dst_missing:
+    dst_files = None
+  else:
+    dst_files = utils.auto(utils.listdir_stat,dst_dir,
+                           time_offset,show_hidden=sync_hidden)
   if dst_files is None: # Directory does not exist
     if not make_dir(dst_dir, dry_run, print_func, recursed):
       return
@@ -63,30 +71,49 @@ def rsync(src_dir, dst_dir, mirror, dry_run, print_func, recursed, sync_hidden):
     for name, stat in dst_files:
       d_dst[name] = stat
 
-  set_dst = set(d_dst.keys())
-  set_src = set(d_src.keys())
-  to_add = set_src - set_dst  # Files to copy to dest
-  to_del = set_dst - set_src  # To delete from dest
-  to_upd = set_dst.intersection(set_src) # In both: may need updating
+  to_add = []  # Files to copy to dest
+  to_upd = []  # In both: may need updating
+  for name in d_src:
+    (to_upd if name in d_dst else to_add).append(name)
+  to_del = [name for name in d_dst if name not in d_src] # To delete from dest
+
+  # files between host and device are collected and sent together, so
+  # comparing the entries doesn't alternate with serial round-trips
+  src_dev = utils.get_dev_and_path(src_dir)[0]
+  dst_dev = utils.get_dev_and_path(dst_dir)[0]
+  if src_dev is None and dst_dev is not None:
+    cp_batch = cp_to_remote
+  elif src_dev is not None and dst_dev is None:
+    cp_batch = cp_from_remote
+  else:
+    cp_batch = None
+  batch = []
+
+  src_prefix = src_dir.rstrip('/') + '/'    # no '//' for the root directory
+  dst_prefix = dst_dir.rstrip('/') + '/'
 
   for src_basename in to_add:  # Name in source but absent from destination
-    src_filename = src_dir + '/' + src_basename
-    dst_filename = dst_dir + '/' + src_basename
-    if dry_run or Options.get().debug:
+    src_filename = src_prefix + src_basename
+    dst_filename = dst_prefix + src_basename
+    if dry_run or debug:
       print_func("Adding %s" % dst_filename)
     src_stat = d_src[src_basename]
-    src_mode = utils.stat_mode(src_stat)
+    src_isdir = utils.mode_isdir(utils.stat_mode(src_stat))
     if not dry_run:
-      if not utils.mode_isdir(src_mode):
-        cp(src_filename, dst_filename)
-    if utils.mode_isdir(src_mode):
+      if not src_isdir:
+        if cp_batch:
+          batch.append((src_filename, dst_filename, utils.stat_size(src_stat)))
+        else:
+          cp(src_filename, dst_filename, utils.stat_size(src_stat))
+    if src_isdir:
       rsync(src_filename, dst_filename, mirror=mirror, dry_run=dry_run,
-            print_func=print_func, recursed=True, sync_hidden=sync_hidden)
+            print_func=print_func, recursed=True, sync_hidden=sync_hidden,
+            src_stat=src_stat, dst_missing=True)
 
   if mirror:  # May delete
     for dst_basename in to_del:  # In dest but not in source
-      dst_filename = dst_dir + '/' + dst_basename
-      if dry_run or Options.get().debug:
+      dst_filename = dst_prefix + dst_basename
+      if dry_run or debug:
         print_func("Removing %s" % dst_filename)
       if not dry_run:
         rm(dst_filename, recursive=True, force=True)
@@ -94,50 +121,60 @@ def rsync(src_dir, dst_dir, mirror, dry_run, print_func, recursed, sync_hidden):
   for src_basename in to_upd:  # Names are identical
     src_stat = d_src[src_basename]
     dst_stat = d_dst[src_basename]
-    src_filename = src_dir + '/' + src_basename
-    dst_filename = dst_dir + '/' + src_basename
-    src_mode = utils.stat_mode(src_stat)
-    dst_mode = utils.stat_mode(dst_stat)
-    if utils.mode_isdir(src_mode):
-      if utils.mode_isdir(dst_mode):
+    src_filename = src_prefix + src_basename
+    dst_filename = dst_prefix + src_basename
+    src_isdir = utils.mode_isdir(utils.stat_mode(src_stat))
+    dst_isdir = utils.mode_isdir(utils.stat_mode(dst_stat))
+    if src_isdir:
+      if dst_isdir:
         # src and dst are both directories - recurse
         rsync(src_filename, dst_filename, mirror=mirror, dry_run=dry_run,
-              print_func=print_func, recursed=True, sync_hidden=sync_hidden)
+              print_func=print_func, recursed=True, sync_hidden=sync_hidden,
+              src_stat=src_stat)
       else:
         msg = "Source '{}' is a directory and destination " \
               "'{}' is a file. Ignoring"
         utils.print_err(msg.format(src_filename, dst_filename))
     else:
-      if utils.mode_isdir(dst_mode):
+      if dst_isdir:
         msg = "Source '{}' is a file and destination " \
               "'{}' is a directory. Ignoring"
         utils.print_err(msg.format(src_filename, dst_filename))
       else:
-        if Options.get().debug:
+        if debug:
           print_func('Checking {}'.format(dst_filename))
 
         mtime_src = utils.stat_mtime(src_stat)
         mtime_dst = utils.stat_mtime(dst_stat)
-        if Options.get().debug:
+        if debug:
           print_func(f"DEBUG: mtime(src)={utils.mtime_pretty(mtime_src)}")
           print_func(f"DEBUG: mtime(dst)={utils.mtime_pretty(mtime_dst)}")
         if mtime_src > mtime_dst:
-          if dry_run or Options.get().debug:
+          if dry_run or debug:
             print_func(f"{src_filename} is newer than {dst_filename} - copying")
           if not dry_run:
-            cp(src_filename, dst_filename)
+            if cp_batch:
+              batch.append((src_filename, dst_filename,
+                            utils.stat_size(src_stat)))
+            else:
+              cp(src_filename, dst_filename, utils.stat_size(src_stat))
+
+  if batch and not cp_batch(batch, options.buffer_size):
+    utils.print_err(f"Unable to copy {len(batch)} files to {dst_dir}")
 
 def make_dir(dst_dir, dry_run, print_func, recursed):
   """Creates a directory. Produces information in case of dry run.
   Issues error where necessary.
   """
-  parent = os.path.split(dst_dir.rstrip('/'))[0] # Check for nonexistent parent
-  parent_files = utils.auto(utils.listdir_lstat,parent,0) if parent else True # Relative dir
   if dry_run:
     if recursed: # Assume success: parent not actually created yet
       print_func(f"Creating directory {dst_dir}")
-    elif parent_files is None:
-      print_func(f"Unable to create {dst_dir}")
+    else:
+      # Check for nonexistent parent (a failing mkdir tells us otherwise)
+      parent = os.path.split(dst_dir.rstrip('/'))[0]
+      parent_files = utils.auto(utils.listdir_lstat,parent,0) if parent else True # Relative dir
+      if parent_files is None:
+        print_func(f"Unable to create {dst_dir}")
     return True
 
   Options.get().verbose and print(f"mkdir {dst_dir}")
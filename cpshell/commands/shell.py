@@ -11,10 +11,14 @@
 # ----------------------------------------------------------------------------
 
 import os
+import shutil
+import subprocess
 
-from .command import Command 
 from cpshell import utils
-from cpshell import device
+from .command import Command 
+
+# characters which need a real shell (globbing, pipes, variables, ...)
+SHELL_CHARS = frozenset('|&;<>()$`\\"\'*?[]{}~#=!%')
 
 class Shell(Command):
 
@@ -36,6 +40,13 @@ class Shell(Command):
     """
     if not args:
       args = ['/bin/bash']
-    #TODO: check if can call subprocess instead - args should be already
-    #      run through shelex
-    os.system(" ".join(args))
+    # builtins (cd, type, ulimit, ...) and metacharacters need a real shell
+    if (shutil.which(args[0]) is None or
+        any(not SHELL_CHARS.isdisjoint(arg) for arg in args)):
+      os.system(" ".join(args))
+      return
+    # args are already split (by shlex), so run them without a shell
+    try:
+      subprocess.run(args, check=False)
+    except OSError as err:
+      utils.print_err(f"{args[0]}: {err.strerror}")
@@ -46,6 +46,7 @@ Or:
 
 import sys
 import time
+import select
 
 stdout = sys.stdout.buffer
 
@@ -88,40 +89,99 @@ class CpBoard:
       raise CpBoardError('failed to access ' + port)
     if delayed:
       print('')
+    self._pending = b''
+    self._poll = self._create_poll()
+
+  def _create_poll(self):
+    # wait for input in the kernel where possible (not on Windows)
+    if not hasattr(select, 'poll'):
+      return None
+    try:
+      poll = select.poll()
+      poll.register(self.serial.fileno(), select.POLLIN)
+      return poll
+    except (AttributeError, OSError, ValueError):
+      return None
 
   def close(self):
     self.serial.close()
 
+  def read(self, num_bytes):
+    # bytes read past the ending by read_until come first
+    data = self._pending[:num_bytes]
+    self._pending = self._pending[num_bytes:]
+    if len(data) < num_bytes:
+      data += self.serial.read(num_bytes - len(data))
+    return data
+
+  @property
+  def in_waiting(self):
+    return len(self._pending) + self.serial.in_waiting
+
   def read_until(self, min_num_bytes, ending, timeout=10, data_consumer=None):
-    data = self.serial.read(min_num_bytes)
-    if data_consumer:
-      data_consumer(data)
-    timeout_count = 0
+    # bytes read past the ending by a previous call come first
+    data = self._pending
+    self._pending = b''
+    if len(data) < min_num_bytes:
+      data += self.serial.read(min_num_bytes - len(data))
+    data = bytearray(data)
+    searched = 0   # bytes before this offset are searched and consumed
+    overlap = len(ending) - 1
+    # without select.poll: poll quickly at first and back off to 10ms
+    # while nothing arrives
+    delay = 0.0005
+    idle_time = 0
     while True:
-      if data.endswith(ending):
+      # the search starts early enough to catch an ending split between reads
+      idx = data.find(ending, max(0, searched - overlap))
+      if idx >= 0:
+        # keep the bytes past the ending for the next read
+        end = idx + overlap + 1
+        self._pending = bytes(data[end:])
+        del data[end:]
+      if data_consumer and len(data) > searched:
+        data_consumer(bytes(data[searched:]))
+      if idx >= 0:
         break
-      elif self.serial.inWaiting() > 0:
-        new_data = self.serial.read(1)
-        data = data + new_data
-        if data_consumer:
-          data_consumer(new_data)
-        timeout_count = 0
+      searched = len(data)
+      n = self.serial.in_waiting
+      if n > 0:
+        data += self.serial.read(n)
+        delay = 0.0005
+        idle_time = 0
+      elif self._poll is not None:
+        if timeout is not None and idle_time >= timeout:
+          break
+        # sleep until data arrives (or the timeout expires)
+        start = time.monotonic()
+        events = self._poll.poll(
+          None if timeout is None else (timeout - idle_time) * 1000)
+        if not events or events[0][1] & (select.POLLERR | select.POLLHUP |
+                                         select.POLLNVAL):
+          break
+        idle_time += time.monotonic() - start
+        # some drivers report POLLIN without data (e.g. while the port
+        # goes away): back off instead of spinning
+        if not self.serial.in_waiting:
+          time.sleep(delay)
+          idle_time += delay
+          delay = min(2 * delay, 0.01)
       else:
-        timeout_count += 1
-        if timeout is not None and timeout_count >= 100 * timeout:
+        if timeout is not None and idle_time >= timeout:
           break
-        time.sleep(0.01)
-    return data
+        time.sleep(delay)
+        idle_time += delay
+        delay = min(2 * delay, 0.01)
+    return bytes(data)
 
   def enter_raw_repl(self):
     #print("2x CTRL-C")
     self.serial.write(b'\r\x03\x03') # ctrl-C twice: interrupt any running program
 
-    # flush input (without relying on serial.flushInput())
-    n = self.serial.inWaiting()
-    while n > 0:
-      self.serial.read(n)
-      n = self.serial.inWaiting()
+    # flush input (the port is always a pyserial port, since telnet support
+    # was dropped)
+    self._pending = b''
+    self.serial.reset_input_buffer()
 
     #print("CTRL-A")
     self.serial.write(b'\r\x01') # ctrl-A: enter raw REPL
@@ -132,8 +192,9 @@ class CpBoard:
 
     #print("CTRL-D")
     self.serial.write(b'\x04') # ctrl-D: soft reset
-    data = self.read_until(1,self._options.soft_reboot,timeout=1)
-    if not data.endswith(self._options.soft_reboot):
+    soft_reboot = self._options.soft_reboot   # localized, see cplocale.py
+    data = self.read_until(1,soft_reboot,timeout=1)
+    if not data.endswith(soft_reboot):
       #print(data)
       raise CpBoardError('could not enter raw repl')
     # By splitting this into 2 reads, it allows boot.py to print stuff,
@@ -173,15 +234,19 @@ class CpBoard:
     if not data.endswith(b'>'):
       raise CpBoardError('could not enter raw repl')
 
-    # write command
-    chunk_size = self._options.chunk_size
-    for i in range(0, len(command_bytes), chunk_size):
-      self.serial.write(command_bytes[i:min(i + chunk_size, len(command_bytes))])
-      time.sleep(self._options.chunk_wait)
+    # write command (in chunks, unless the device needs no pauses)
+    chunk_wait = self._options.chunk_wait
+    if not chunk_wait:
+      self.serial.write(command_bytes)
+    else:
+      chunk_size = self._options.chunk_size
+      for i in range(0, len(command_bytes), chunk_size):
+        self.serial.write(command_bytes[i:i + chunk_size])
+        time.sleep(chunk_wait)
     self.serial.write(b'\x04')
 
     # check if we could exec command
-    data = self.serial.read(2)
+    data = self.read(2)
     if data != b'OK':
       raise CpBoardError(f'could not exec command, {data=}')
 
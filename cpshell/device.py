@@ -10,8 +10,10 @@
 # Website: https://github.com/bablokb/cp-shell
 # ----------------------------------------------------------------------------
 
+import os
 import sys
 import time
+import bisect
 import inspect
 import token
 import tokenize
@@ -22,9 +24,18 @@ from .cpboard import CpBoard, CpBoardError
 from . import utils
 from .options import Options
 
+def _rstrip_parts(parts):
+  """Strips trailing whitespace from a list of source fragments."""
+  while parts:
+    last = parts[-1].rstrip(' \t\n')
+    if last:
+      parts[-1] = last
+      return
+    parts.pop()
+
 def strip_source(source):
   """ Strip out comments and Docstrings from some python source code."""
-  mod = ""
+  parts = []
 
   prev_toktype = token.INDENT
   last_lineno = -1
@@ -41,19 +52,41 @@ def strip_source(source):
     if slineno > last_lineno:
       last_col = 0
     if scol > last_col:
-      mod += " " * (scol - last_col)
+      parts.append(" " * (scol - last_col))
     if toktype == token.STRING and prev_toktype == token.INDENT:
       # Docstring
-      mod = mod.rstrip(' \t\n')
+      _rstrip_parts(parts)
     elif toktype == tokenize.COMMENT:
       # Comment
-      mod = mod.rstrip(' \t\n')
+      _rstrip_parts(parts)
     else:
-      mod += ttext
+      parts.append(ttext)
     prev_toktype = toktype
     last_col = ecol
     last_lineno = elineno
-  return mod
+  return "".join(parts)
+
+_remote_sources = {}
+
+def get_remote_source(func):
+  """Returns the name and the stripped source (including extra functions)
+    of a function which runs on the board. The result is cached.
+  """
+  if func in _remote_sources:
+    return _remote_sources[func]
+  if hasattr(func, 'extra_funcs'):
+    func_name = func.name
+    func_lines = []
+    for extra_func in func.extra_funcs:
+      func_lines += inspect.getsource(extra_func).split('\n')
+      func_lines += ['']
+    func_lines += filter(lambda line: line[:1] != '@', func.source.split('\n'))
+    func_src = '\n'.join(func_lines)
+  else:
+    func_name = func.__name__
+    func_src = inspect.getsource(func)
+  _remote_sources[func] = (func_name, strip_source(func_src))
+  return _remote_sources[func]
 
 def remote_repr(i):
   """Helper function to deal with types which we can't send to the board."""
@@ -95,6 +128,8 @@ class Device(object):
   def __init__(self,options,cpb=None):
     self.options = options
     self.cpb = cpb
+    self._root_dirs = None
+    self._root_prefixes = ()
 
   # --- setup of the device   ------------------------------------------------
 
@@ -106,15 +141,44 @@ class Device(object):
     #self.sysname = self.remote_eval(sysname)
     #self.options.verbose and print(self.sysname)
 
-    self.options.debug and print('Retrieving root directories ... ', end='', flush=True)
-    self.root_dirs = ['/{}/'.format(dir) for dir in self.remote_eval(utils.listdir, '/')]
-    self.options.debug and print(' '.join(self.root_dirs))
+    self.root_dirs     # query and cache root directories
 
     if self.options.upd_time:
       self.options.verbose and print('Setting time ... ', end='', flush=True)
       now = self.sync_time()
       self.options.verbose and print(time.strftime('%b %d, %Y %H:%M:%S', now))
 
+  @property
+  def root_dirs(self):
+    """ root directories of the device (queried on first access) """
+    if self._root_dirs is None:
+      self.options.debug and print('Retrieving root directories ... ', end='', flush=True)
+      self._root_dirs = sorted(sys.intern('/{}/'.format(dir))
+                          for dir in self.remote_eval(utils.listdir, '/'))
+      self._root_prefixes = tuple(self._root_dirs)
+      self.options.debug and print(' '.join(self._root_dirs))
+    return self._root_dirs
+
+  def invalidate_root_dirs(self):
+    """ force a new query of the root directories on next access """
+    self._root_dirs = None
+
+  def update_root_dir(self, dev_filename, exists):
+    """ add or remove a single entry of the cached root directories """
+    name = dev_filename.strip('/')
+    if self._root_dirs is None or not name or '/' in name:
+      return             # not cached yet, or not in the root directory
+    root_dir = sys.intern('/' + name + '/')
+    idx = bisect.bisect_left(self._root_dirs, root_dir)
+    found = idx < len(self._root_dirs) and self._root_dirs[idx] == root_dir
+    if exists and not found:
+      self._root_dirs.insert(idx, root_dir)
+    elif not exists and found:
+      del self._root_dirs[idx]
+    else:
+      return
+    self._root_prefixes = tuple(self._root_dirs)
+
   def check_cpb(self):
     """Raises an error if the cpb object was closed."""
     if self.cpb is None:
@@ -129,49 +193,46 @@ class Device(object):
 
   def is_root_path(self, filename):
     """Determines if 'filename' corresponds to a directory on this device."""
-    test_filename = filename + '/'
-    for root_dir in self.root_dirs:
-      if test_filename.startswith(root_dir):
-        return True
-    return False
+    if self._root_dirs is None:
+      self.root_dirs      # query and cache root directories
+    return (filename + '/').startswith(self._root_prefixes)
 
   def read(self, num_bytes):
     """Reads data from the board over the serial port."""
     self.check_cpb()
     try:
-      return self.cpb.serial.read(num_bytes)
+      return self.cpb.read(num_bytes)
     except (serial.serialutil.SerialException, TypeError):
       # Write failed - assume that we got disconnected
       self.close()
       raise DeviceError('serial port %s closed' % self.dev_name_short)
 
+  @property
+  def in_waiting(self):
+    """Returns the number of bytes which can be read without blocking."""
+    self.check_cpb()
+    try:
+      return self.cpb.in_waiting
+    except (serial.serialutil.SerialException, OSError, TypeError):
+      self.close()
+      raise DeviceError('serial port %s closed' % self.dev_name_short)
+
   def remote(self, func, *args, xfer_func=None, **kwargs):
     """Calls func with the indicated args on the CircuitPython board."""
-    if hasattr(func, 'extra_funcs'):
-      func_name = func.name
-      func_lines = []
-      for extra_func in func.extra_funcs:
-        func_lines += inspect.getsource(extra_func).split('\n')
-        func_lines += ['']
-      func_lines += filter(lambda line: line[:1] != '@', func.source.split('\n'))
-      func_src = '\n'.join(func_lines)
-    else:
-      func_name = func.__name__
-      func_src = inspect.getsource(func)
-    func_src = strip_source(func_src)
+    func_name, func_src = get_remote_source(func)
     args_arr = [remote_repr(i) for i in args]
     kwargs_arr = ["{}={}".format(k, remote_repr(v)) for k, v in kwargs.items()]
-    func_src += 'try:\n'
-    func_src += '  output = ' + func_name + '('
-    func_src += ', '.join(args_arr + kwargs_arr)
-    func_src += ')\n'
-    func_src += 'except Exception as ex:\n'
-    func_src += '  print(ex)\n'
-    func_src += '  output = None\n'
-    func_src += 'if output is None:\n'
-    func_src += '  print("None")\n'
-    func_src += 'else:\n'
-    func_src += '  print(output)\n'
+    func_src = (
+      f"{func_src}"
+      f"try:\n"
+      f"  output = {func_name}({', '.join(args_arr + kwargs_arr)})\n"
+      f"except Exception as ex:\n"
+      f"  print(ex)\n"
+      f"  output = None\n"
+      f"if output is None:\n"
+      f"  print(\"None\")\n"
+      f"else:\n"
+      f"  print(output)\n")
     if self.options.debug:
       print(
         '----- About to send %d bytes of code to the board -----' % len(func_src))
@@ -258,21 +319,34 @@ class DeviceSerial(Device):
     self.wait = wait
 
     if wait and not os.path.exists(port):
-      toggle = False
+      monitor = self._tty_monitor()
+      deadline = time.monotonic() + wait
+      next_dot = time.monotonic() + 0.5
       try:
         if self.options.verbose:
           sys.stdout.write("Waiting %d seconds for serial port '%s' to exist" % (wait, port))
           sys.stdout.flush()
-        while wait and not os.path.exists(port):
-          if self.options.verbose:
+        while not os.path.exists(port):
+          remaining = deadline - time.monotonic()
+          if remaining <= 0:
+            break
+          if monitor is None:
+            time.sleep(min(0.5, remaining))
+          else:
+            # returns early if a tty was added or removed
+            monitor.poll(timeout=min(0.5, remaining))
+          if self.options.verbose and time.monotonic() >= next_dot:
             sys.stdout.write('.')
             sys.stdout.flush()
-          time.sleep(0.5)
-          toggle = not toggle
-          wait = wait if not toggle else wait -1
+            next_dot += 0.5
         self.options.verbose and sys.stdout.write("\n")
       except KeyboardInterrupt:
         raise DeviceError('Interrupted')
+      finally:
+        # releasing the last reference closes the netlink socket
+        monitor = None
+      # CpBoard waits at most for the rest of the time
+      wait = max(0, int(deadline - time.monotonic()))
 
     self.name = port
     self.dev_name_long = '%s at %d baud' % (port, baud)
@@ -284,6 +358,13 @@ class DeviceSerial(Device):
       print(err)
       sys.exit(1)
 
+    # USB-serial adapters (e.g. FTDI) buffer incoming data for some
+    # milliseconds, low latency mode turns this off (Linux only)
+    try:
+      self.cpb.serial.set_low_latency_mode(True)
+    except (AttributeError, NotImplementedError, ValueError, OSError):
+      self.options.debug and print(f"low latency mode not supported by {port}")
+
     # Bluetooth devices take some time to connect at startup, and writes
     # issued while the remote isn't connected will fail. So we send newlines
     # with pauses until one of our writes succeeds.
@@ -330,6 +411,22 @@ class DeviceSerial(Device):
     self.setup()
     self.dev_name_short = port
 
+  def _tty_monitor(self):
+    """Returns a pyudev monitor for tty devices, or None if pyudev is not
+      available.
+    """
+    try:
+      import pyudev
+    except ImportError:
+      return None
+    try:
+      monitor = pyudev.Monitor.from_netlink(pyudev.Context())
+      monitor.filter_by('tty')
+      monitor.start()
+    except OSError:
+      return None
+    return monitor
+
   @property
   def timeout(self):
     """Gets the timeout associated with the serial port."""
@@ -93,13 +93,15 @@ def validate_pattern(fn,cur_dir):
   return target, pattern
 
 def process_pattern(fn,cur_dir):
-  """Return a list of paths matching a pattern (or None on error).
+  """Return a list of absolute paths matching a pattern (or None on error).
+  The paths are already resolved.
   """
   directory, pattern = validate_pattern(fn,cur_dir)
   if directory is not None:
     filenames = fnmatch.filter(auto(listdir, directory), pattern)
     if filenames:
-      return [directory + '/' + sfn for sfn in filenames]
+      prefix = directory if directory[-1] == '/' else directory + '/'
+      return [prefix + sfn for sfn in filenames]
     else:
       print_err("cannot access '{}': No such file or directory".format(fn))
 
@@ -142,6 +144,22 @@ def get_dev_and_path(filename):
       return (dev, dev_filename)
   return (None, filename)
 
+def invalidate_root_dirs(filename):
+  """Invalidates the cached root directories of the device if filename
+    is located in the root directory of the device.
+  """
+  dev, dev_filename = get_dev_and_path(filename)
+  if dev and dev_filename.rstrip('/').rfind('/') <= 0:
+    dev.invalidate_root_dirs()
+
+def update_root_dirs(filename, exists):
+  """Adds filename to (or removes it from) the cached root directories of
+    the device, if it is located in the root directory of the device.
+  """
+  dev, dev_filename = get_dev_and_path(filename)
+  if dev:
+    dev.update_root_dir(dev_filename, exists)
+
 def get_mode(filename):
   """Returns the mode of a file, which can be used to determine if a file
     exists, if a file is a file or a directory.
@@ -154,6 +172,40 @@ def get_mode(filename):
   except OSError:
     return 0
 
+def get_modes_sizes(filenames):
+  """Returns a list of (mode, size) tuples for a list of files, so that
+    a single call can check multiple files. Missing files return (0, -1).
+  """
+  import os
+  result = []
+  for filename in filenames:
+    try:
+      stat = os.stat(filename)
+      result.append((stat[0], stat[6]))
+    except OSError:
+      result.append((0, -1))
+  return result
+
+def auto_modes_sizes(filenames):
+  """Returns a dict mapping each filename to its (mode, size) tuple. The
+    remote files are queried with a single call to the device.
+  """
+  result = {}
+  remote_files = []
+  for filename in filenames:
+    dev, dev_filename = get_dev_and_path(filename)
+    if dev is None:
+      result[filename] = get_modes_sizes([dev_filename])[0]
+    else:
+      remote_files.append((filename, dev_filename))
+  if remote_files:
+    dev = device.Device.get_device()
+    remote_stats = dev.remote_eval(get_modes_sizes,
+                                   [dev_filename for _, dev_filename
+                                                     in remote_files])
+    for (filename, _), stat in zip(remote_files, remote_stats):
+      result[filename] = stat
+  return result
 
 def lstat(filename,time_offset):
   """Returns os.lstat for a given file, adjusting the timestamps as appropriate.
@@ -285,6 +337,24 @@ def listdir_matches(match):
              for filename in os.listdir(dirname)
              if filename.startswith(match_prefix)]
 
+def listdir_matches_local(match):
+  """Host-only variant of listdir_matches: uses os.scandir, which knows
+    the type of each entry without an additional stat.
+  """
+  last_slash = match.rfind('/')
+  if last_slash == -1:
+    dirname = '.'
+    match_prefix = match
+    result_prefix = ''
+  else:
+    match_prefix = match[last_slash + 1:]
+    dirname = match[0:last_slash] or '/'
+    result_prefix = match[0:last_slash + 1]
+  with os.scandir(dirname) as entries:
+    return [result_prefix + entry.name + '/' if entry.is_dir() else
+                                              result_prefix + entry.name
+              for entry in entries if entry.name.startswith(match_prefix)]
+
 @extra_funcs(is_visible, lstat)
 def listdir_lstat(dirname, time_offset,show_hidden=True):
   """Returns a list of tuples for each file contained in the named
@@ -303,17 +373,19 @@ def listdir_lstat(dirname, time_offset,show_hidden=True):
 
 
 @extra_funcs(is_visible, stat)
-def listdir_stat(dirname, time_offset, show_hidden=True):
+def listdir_stat(dirname, time_offset, show_hidden=True, ignore=None):
   """Returns a list of tuples for each file contained in the named
     directory, or None if the directory does not exist. Each tuple
     contains the filename, followed by the tuple returned by
-    calling os.stat on the filename.
+    calling os.stat on the filename. Names in ignore are skipped.
   """
   import os
   try:
     files = os.listdir(dirname)
   except OSError:
     return None
+  if ignore:
+    files = [file for file in files if file not in ignore]
   if dirname == '/':
     return list((file, stat('/' + file,time_offset)) for file in files if is_visible(file) or show_hidden)
   return list((file, stat(dirname + '/' + file,time_offset)) for file in files if is_visible(file) or show_hidden)
@@ -422,11 +494,45 @@ def recv_file_from_host(src_file, dst_filename, filesize, buf_size,dst_mode='wb'
     return False
 
 
+@extra_funcs(recv_file_from_host)
+def recv_files_from_host(dst_filenames, filesizes, buf_size):
+  """Function which runs on the board. Receives multiple files within a
+    single call. Matches up with send_files_to_remote.
+  """
+  for i in range(len(dst_filenames)):
+    if not recv_file_from_host(None, dst_filenames[i], filesizes[i], buf_size):
+      return False
+  return True
+
+
+def send_files_to_remote(dev, src_filenames, dst_filenames, filesizes,
+                         buf_size):
+  """Intended to be passed to the `remote` function as the xfer_func argument.
+    Matches up with recv_files_from_host.
+  """
+  for src_filename, dst_filename, filesize in zip(src_filenames,
+                                                  dst_filenames, filesizes):
+    with open(src_filename, 'rb') as src_file:
+      send_file_to_remote(dev, src_file, dst_filename, filesize)
+
+
+_xfer_buf = bytearray()
+
+def get_xfer_buffer(size):
+  """Returns a (host-side) transfer buffer of at least size bytes. The buffer
+    is shared, so that copying many files doesn't allocate a new one per file.
+  """
+  global _xfer_buf
+  if len(_xfer_buf) < size:
+    _xfer_buf = bytearray(size)
+  return _xfer_buf
+
 def send_file_to_remote(dev, src_file, dst_filename, filesize, dst_mode='wb'):
   """Intended to be passed to the `remote` function as the xfer_func argument.
     Matches up with recv_file_from_host.
   """
   bytes_remaining = filesize
+  buf_size = Options.get().buffer_size // 2
   save_timeout = dev.timeout
   dev.timeout = 2
   while bytes_remaining > 0:
@@ -435,7 +541,6 @@ def send_file_to_remote(dev, src_file, dst_filename, filesize, dst_mode='wb'):
     if ack is None or ack != b'\x06':
       raise RuntimeError("timed out or error in transfer to remote: {!r}\n".format(ack))
 
-    buf_size = Options.get().buffer_size // 2
     read_size = min(bytes_remaining, buf_size)
     buf = src_file.read(read_size)
     #sys.stdout.write('\r%d/%d' % (filesize - bytes_remaining, filesize))
@@ -452,7 +557,7 @@ def recv_file_from_remote(dev, src_filename, dst_file, filesize, buf_size):
   """
   bytes_remaining = filesize
   bytes_remaining *= 2  # hexlify makes each byte into 2
-  write_buf = bytearray(buf_size)
+  write_buf = get_xfer_buffer(buf_size)
   while bytes_remaining > 0:
     read_size = min(bytes_remaining, buf_size)
     buf_remaining = read_size
@@ -461,12 +566,15 @@ def recv_file_from_remote(dev, src_filename, dst_file, filesize, buf_size):
       read_buf = dev.read(buf_remaining)
       bytes_read = len(read_buf)
       if bytes_read:
-        write_buf[buf_index:bytes_read] = read_buf[0:bytes_read]
+        write_buf[buf_index:buf_index+bytes_read] = read_buf
         buf_index += bytes_read
         buf_remaining -= bytes_read
-    dst_file.write(binascii.unhexlify(write_buf[0:read_size]))
-    # Send an ack to the remote as a form of flow control
+    data = binascii.unhexlify(write_buf[0:read_size])
+    # Send an ack to the remote as a form of flow control. This is done
+    # before writing the data, so the board already sends the next chunk
+    # while we write this one.
     dev.write(b'\x06')   # ASCII ACK is 0x06
+    dst_file.write(data)
     bytes_remaining -= read_size
 
 
@@ -495,6 +603,27 @@ def send_file_to_host(src_filename, dst_file, filesize, buf_size):
   except:
     return False
 
+@extra_funcs(send_file_to_host)
+def send_files_to_host(src_filenames, filesizes, buf_size):
+  """Function which runs on the board. Sends multiple files within a
+    single call. Matches up with recv_files_from_remote.
+  """
+  for i in range(len(src_filenames)):
+    if not send_file_to_host(src_filenames[i], None, filesizes[i], buf_size):
+      return False
+  return True
+
+
+def recv_files_from_remote(dev, src_filenames, dst_filenames, filesizes,
+                           buf_size):
+  """Intended to be passed to the `remote` function as the xfer_func argument.
+    Matches up with send_files_to_host.
+  """
+  for src_filename, dst_filename, filesize in zip(src_filenames,
+                                                  dst_filenames, filesizes):
+    with open(dst_filename, 'wb') as dst_file:
+      recv_file_from_remote(dev, src_filename, dst_file, filesize, buf_size)
+
 def connect(port, baud=115200, wait=0):
   """Connect to a CircuitPython board via a serial port."""
   options = Options.get()